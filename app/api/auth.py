@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm, OAuth2PasswordBearer
 from datetime import timedelta
 from typing import Annotated
@@ -8,6 +8,7 @@ from app.services.auth import (
     update_user_password, delete_user_from_db
 )
 from app.models.user import UserCreate, User, UserUpdate
+from app.services.purge import run_user_purge
 from jose import JWTError, jwt
 
 router = APIRouter()
@@ -100,8 +101,11 @@ async def update_user_password(
         )
 
 @router.delete("/users/me", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_user(current_user: Annotated[User, Depends(get_current_user)]):
-    """Delete the current user."""
+async def delete_user(
+    background_tasks: BackgroundTasks,
+    current_user: Annotated[User, Depends(get_current_user)]
+):
+    """Delete the current user and purge their journal data in the background."""
     try:
         deleted = delete_user_from_db(current_user.email)
         if not deleted:
@@ -109,6 +113,7 @@ async def delete_user(current_user: Annotated[User, Depends(get_current_user)]):
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="User deletion failed"
             )
+        background_tasks.add_task(run_user_purge, current_user.key)
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -1,18 +1,37 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, status
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Query, Request, Response, status
+from typing import List, Literal, Optional
 from pydantic import ValidationError
-from app.models.journal import JournalEntryCreate, JournalEntry, JournalEntryUpdate
-from app.services.journal import create_journal_entry, get_journal_entry, update_journal_entry, delete_journal_entry, get_all_journal_entries
+from app.models.journal import JournalEntryCreate, JournalEntry, JournalEntryUpdate, JournalChanges
+from app.services.journal import create_journal_entry, update_journal_entry, delete_journal_entry, filter_journal_entries
+from app.services.journal import get_journal_entry_data, get_user_version, get_journal_changes
 from app.services.transcription import transcribe_audio
 from app.core.security import get_current_user
 from app.models.user import User
 from datetime import datetime
 from fastapi.responses import JSONResponse
+import hashlib
 import logging
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
+# Define constants
+VERSION_HEADER = "X-Journal-Version"
+
+def _make_etag(*parts) -> str:
+    return '"' + hashlib.sha1(":".join(str(part) for part in parts).encode()).hexdigest() + '"'
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    """Check an ETag against If-None-Match, which uses weak comparison."""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    tags = [tag.strip() for tag in header.split(",")]
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+def _not_modified(etag: str, headers: dict = None) -> Response:
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag, **(headers or {})})
+
 @router.post("/entries", response_model=JournalEntry)
 async def create_entry(entry: JournalEntryCreate, current_user: User = Depends(get_current_user)):
     try:
@@ -22,12 +41,17 @@ async def create_entry(entry: JournalEntryCreate, current_user: User = Depends(g
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="An error occurred while creating the journal entry")
 
 @router.get("/entries/{entry_id}", response_model=JournalEntry)
-async def read_entry(entry_id: str, current_user: User = Depends(get_current_user)):
+async def read_entry(entry_id: str, request: Request, response: Response, current_user: User = Depends(get_current_user)):
     try:
-        entry = get_journal_entry(entry_id, current_user.key)
+        entry = get_journal_entry_data(entry_id, current_user.key)
         if entry is None:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Entry not found")
-        return entry
+        # Compare against the stored row before building and serializing the model
+        etag = _make_etag(entry['key'], entry['updated_at'])
+        if _etag_matches(request, etag):
+            return _not_modified(etag)
+        response.headers["ETag"] = etag
+        return JournalEntry(**entry)
     except HTTPException:
         raise
     except Exception as e:
@@ -62,17 +86,51 @@ async def delete_entry(entry_id: str, current_user: User = Depends(get_current_u
 
 @router.get("/entries", response_model=List[JournalEntry])
 async def read_entries(
+    request: Request,
+    response: Response,
     skip: int = 0,
     limit: int = 100,
+    tags: Optional[List[str]] = Query(None),
+    match: Literal["any", "all"] = "any",
+    date_from: Optional[datetime] = Query(None, alias="from"),
+    date_to: Optional[datetime] = Query(None, alias="to"),
+    order: Literal["asc", "desc"] = "desc",
     current_user: User = Depends(get_current_user)
 ):
     try:
-        entries = get_all_journal_entries(current_user.key)
-        return entries[skip : skip + limit]
+        # Any entry change bumps the user's version, so it stands in for the listing's content
+        version = get_user_version(current_user.key)
+        etag = _make_etag(current_user.key, version, request.url.query)
+        if _etag_matches(request, etag):
+            return _not_modified(etag, {VERSION_HEADER: str(version)})
+        response.headers["ETag"] = etag
+        response.headers[VERSION_HEADER] = str(version)
+
+        return filter_journal_entries(
+            current_user.key,
+            tags=tags,
+            match_all=match == "all",
+            date_from=date_from,
+            date_to=date_to,
+            descending=order == "desc",
+            skip=skip,
+            limit=limit,
+        )
     except Exception as e:
         logger.error(f"Error retrieving journal entries: {str(e)}")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="An error occurred while retrieving journal entries")
 
+@router.get("/changes", response_model=JournalChanges)
+async def read_changes(
+    since: int = Query(..., ge=0),
+    current_user: User = Depends(get_current_user)
+):
+    try:
+        return get_journal_changes(current_user.key, since)
+    except Exception as e:
+        logger.error(f"Error retrieving journal changes: {str(e)}")
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="An error occurred while retrieving journal changes")
+
 @router.post("/entries/transcribe", response_model=JournalEntry)
 async def transcribe_audio_entry(
     file: UploadFile = File(...),
@@ -17,5 +17,12 @@ class Settings:
     SENTENCE_TRANSFORMER_MODEL: str = "all-MiniLM-L6-v2"
     
     EMBEDDING_DIM: int = 384  # Dimension of all-MiniLM-L6-v2 embeddings
+    
+    VECTOR_INDEX_DIR: str = os.getenv("VECTOR_INDEX_DIR", "./data/journal_index")
+    VECTOR_INDEX_MODE: str = os.getenv("VECTOR_INDEX_MODE", "hnsw")  # "hnsw" or "int8"
+    VECTOR_RERANK_FACTOR: int = int(os.getenv("VECTOR_RERANK_FACTOR", 4))  # int8 candidates re-ranked per result
+    
+    PURGE_BATCH_SIZE: int = int(os.getenv("PURGE_BATCH_SIZE", 100))
+    CHANGE_LOG_RETENTION_DAYS: int = int(os.getenv("CHANGE_LOG_RETENTION_DAYS", 30))
 
 settings = Settings()
\ No newline at end of file
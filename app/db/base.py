@@ -3,4 +3,23 @@ from app.core.config import settings
 
 deta = Deta(settings.DETA_PROJECT_KEY)
 journal_base = deta.Base("journal_entries")
-user_base = deta.Base("journal_users")
\ No newline at end of file
+journal_index_base = deta.Base("journal_entry_index")
+journal_change_base = deta.Base("journal_changes")
+journal_version_base = deta.Base("journal_versions")
+user_base = deta.Base("journal_users")
+purge_base = deta.Base("journal_purge_jobs")
+
+def iter_pages(base, query=None, limit: int = 1000):
+    """Yield each page of items matching a query, following Deta's pagination.
+
+    Deta filters after reading a page, so a page can be empty while more matches follow.
+    """
+    response = base.fetch(query, limit=limit)
+    yield response.items
+    while response.last:
+        response = base.fetch(query, limit=limit, last=response.last)
+        yield response.items
+
+def fetch_all(base, query=None) -> list:
+    """Fetch every item matching a query, following Deta's pagination."""
+    return [item for page in iter_pages(base, query) for item in page]
\ No newline at end of file
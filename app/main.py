@@ -2,8 +2,13 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.api import auth, journal, search, summarization
 from app.core.config import settings
+from app.services.purge import resume_pending_purges
+import asyncio
+import logging
 import time
 
+logger = logging.getLogger(__name__)
+
 app = FastAPI(
     title=settings.PROJECT_NAME, 
     version=settings.PROJECT_VERSION,
@@ -26,6 +31,16 @@ app.include_router(journal.router, prefix="/journal", tags=["journal"])
 app.include_router(search.router, prefix="/journal", tags=["search"])
 app.include_router(summarization.router, prefix="/summarization", tags=["summarization"])
 
+@app.on_event("startup")
+async def resume_purges():
+    # Finish user purges interrupted by a crash or restart without blocking startup
+    future = asyncio.get_running_loop().run_in_executor(None, resume_pending_purges)
+    future.add_done_callback(_log_resume_failure)
+
+def _log_resume_failure(future):
+    if not future.cancelled() and future.exception():
+        logger.error(f"Error resuming purges: {str(future.exception())}")
+
 @app.get("/")
 async def root():
     return {"message": "Welcome to the Journal App API"}
@@ -35,3 +35,16 @@ class JournalEntryUpdate(BaseModel):
     title: Optional[str] = None
     content: Optional[str] = None
     tags: Optional[List[str]] = None
+
+# Define a model for a single change in the journal change feed
+class JournalChange(BaseModel):
+    entry_key: str
+    op: str
+    version: int
+    entry: Optional[JournalEntry] = None
+
+# Define a model for a page of the journal change feed
+class JournalChanges(BaseModel):
+    version: int
+    changes: List[JournalChange]
+    relist: bool = False
@@ -4,6 +4,7 @@ from passlib.context import CryptContext
 from app.core.config import settings
 from app.db.base import user_base
 from app.models.user import UserCreate, UserInDB, User
+from app.services.purge import enqueue_user_purge
 import uuid
 
 # Define constants
@@ -91,10 +92,12 @@ def update_user_password(email: str, new_password: str) -> User | None:
 
 # Define a function to delete a user from the database
 def delete_user_from_db(email: str) -> bool:
-    """Delete a user from the database."""
+    """Delete a user from the database and queue the purge of their journal data."""
     user = get_user(email)
     if not user:
         return False
     
+    # Record the purge before the user disappears so it survives a crash
+    enqueue_user_purge(user.key)
     user_base.delete(user.key)
     return True
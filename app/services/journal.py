@@ -1,14 +1,20 @@
-from app.models.journal import JournalEntryCreate, JournalEntry, JournalEntryUpdate
+from app.models.journal import JournalEntryCreate, JournalEntry, JournalEntryUpdate, JournalChange, JournalChanges
+from app.core.config import settings
 from app.utils.embeddings import get_embedding
+from app.services.vector_index import QuantizedDocumentIndex
 from docarray import BaseDoc, DocList
 from docarray.index import HnswDocumentIndex
 from docarray.typing import NdArray, ID
-from app.db.base import journal_base
-from datetime import datetime
+from app.db.base import journal_base, journal_index_base, journal_change_base, journal_version_base, fetch_all, iter_pages
+from datetime import datetime, timezone
+from itertools import groupby
+from urllib.parse import quote
 import numpy as np
+import heapq
 import uuid
 import json
-from typing import List
+import os
+from typing import List, Optional
 
 class JournalDoc(BaseDoc):
     id: ID = None
@@ -17,7 +23,27 @@ class JournalDoc(BaseDoc):
     user_key: str
     embedding: NdArray[384]  # Assuming 384 is the dimension of your embeddings
 
-doc_index = HnswDocumentIndex[JournalDoc](work_dir='./data/journal_index')
+def _load_journal_doc(key: str) -> Optional[JournalDoc]:
+    entry = journal_base.get(key)
+    if entry is None:
+        return None
+    return JournalDoc(
+        id=key,
+        title=entry['title'],
+        content=entry['content'],
+        user_key=entry['user_key'],
+        embedding=np.array(entry['embedding'])
+    )
+
+if settings.VECTOR_INDEX_MODE == "int8":
+    doc_index = QuantizedDocumentIndex(
+        work_dir=os.path.join(settings.VECTOR_INDEX_DIR, 'int8'),
+        dim=settings.EMBEDDING_DIM,
+        load_doc=_load_journal_doc,
+        rerank_factor=settings.VECTOR_RERANK_FACTOR,
+    )
+else:
+    doc_index = HnswDocumentIndex[JournalDoc](work_dir=settings.VECTOR_INDEX_DIR)
 
 class DateTimeEncoder(json.JSONEncoder):
     def default(self, obj):
@@ -25,6 +51,96 @@ class DateTimeEncoder(json.JSONEncoder):
             return obj.isoformat()
         return super().default(obj)
 
+# Deta caps put_many at 25 items per call
+INDEX_BATCH_SIZE = 25
+
+def utc_timestamp(value: datetime) -> float:
+    # Naive datetimes are stored as UTC throughout the app
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+# Index keys end in a fixed-width creation time, so Deta's key order is creation order;
+# descending listings read a second row per entry keyed by the inverted time
+TIMESTAMP_CEILING = 9999999999.999999
+INDEX_PAGE_SIZE = 1000
+
+def _sortable_timestamp(ts: float, descending: bool = False) -> str:
+    ts = min(max(ts, 0.0), TIMESTAMP_CEILING)
+    return f"{(TIMESTAMP_CEILING - ts if descending else ts):017.6f}"
+
+def _index_prefix(user_key: str, tag: Optional[str] = None, descending: bool = False) -> str:
+    if tag is None:
+        return f"{user_key}#{'C' if descending else 'c'}#"
+    # Escaping keeps a '#' inside a tag from colliding with another tag's prefix
+    return f"{user_key}#{'T' if descending else 't'}#{quote(tag, safe='')}#"
+
+def _index_rows(entry: JournalEntry) -> List[dict]:
+    """Build the secondary index rows for an entry, keyed by (user_key, tag) and (user_key, created_at)."""
+    created_ts = utc_timestamp(entry.created_at)
+    rows = []
+    for tag in [None, *sorted(set(entry.tags))]:
+        for descending in (False, True):
+            prefix = _index_prefix(entry.user_key, tag, descending)
+            rows.append({
+                "key": f"{prefix}{_sortable_timestamp(created_ts, descending)}#{entry.key}",
+                "user_key": entry.user_key,
+                "entry_key": entry.key,
+                "created_ts": created_ts,
+            })
+    return rows
+
+def _iter_index(prefix: str, lower: str, upper: str, page_size: int):
+    """Yield (sort key, entry key) for index rows under a prefix, in key order."""
+    query = {"key?r": [prefix + lower, prefix + upper]}
+    for page in iter_pages(journal_index_base, query, limit=page_size):
+        for row in page:
+            yield row["key"][len(prefix):], row["entry_key"]
+
+# Change log rows expire on their own after the retention window
+CHANGE_LOG_RETENTION = settings.CHANGE_LOG_RETENTION_DAYS * 24 * 60 * 60
+OP_UPSERT = "upsert"
+OP_DELETE = "delete"
+# Versions below a client's cursor that are re-sent, to cover change rows written late
+CHANGE_FEED_OVERLAP = 32
+
+def _bump_version(user_key: str) -> int:
+    """Atomically increment the user's change counter and return its new value."""
+    increment = {"version": journal_version_base.util.increment(1)}
+    try:
+        journal_version_base.update(increment, user_key)
+    except Exception:
+        # No counter yet; insert fails if a concurrent change just created it
+        try:
+            journal_version_base.insert({"key": user_key, "version": 1})
+        except Exception:
+            journal_version_base.update(increment, user_key)
+    return get_user_version(user_key)
+
+def _record_change(user_key: str, entry_key: str, op: str) -> int:
+    """Bump the user's change version and append the entry change to the log."""
+    version = _bump_version(user_key)
+    journal_change_base.put({
+        "user_key": user_key,
+        "entry_key": entry_key,
+        "op": op,
+        "version": version,
+    }, expire_in=CHANGE_LOG_RETENTION)
+    return version
+
+def get_user_version(user_key: str) -> int:
+    """Get the version of a user's latest entry change, or 0 if none was recorded."""
+    row = journal_version_base.get(user_key)
+    return row["version"] if row else 0
+
+def _put_index_rows(rows: List[dict]):
+    for i in range(0, len(rows), INDEX_BATCH_SIZE):
+        journal_index_base.put_many(rows[i : i + INDEX_BATCH_SIZE])
+
+def _delete_index_rows(rows: List[dict]):
+    for row in rows:
+        journal_index_base.delete(row["key"])
+
 def create_journal_entry(entry: JournalEntryCreate, user_key: str) -> JournalEntry:
     embedding = get_embedding(f"{entry.title} {entry.content}")
     journal_key = uuid.uuid4().hex
@@ -53,11 +169,20 @@ def create_journal_entry(entry: JournalEntryCreate, user_key: str) -> JournalEnt
     # Store the entry in the database
     entry_dict = json.loads(json.dumps(new_entry.dict(), cls=DateTimeEncoder))
     journal_base.put(entry_dict)
+    _put_index_rows(_index_rows(new_entry))
+    _record_change(user_key, journal_key, OP_UPSERT)
     return new_entry
 
-def get_journal_entry(key: str, user_key: str) -> JournalEntry:
+def get_journal_entry_data(key: str, user_key: str) -> Optional[dict]:
+    """Get an entry's stored row without building a model from it."""
     entry = journal_base.get(key)
     if entry and entry['user_key'] == user_key:
+        return entry
+    return None
+
+def get_journal_entry(key: str, user_key: str) -> JournalEntry:
+    entry = get_journal_entry_data(key, user_key)
+    if entry:
         return JournalEntry(**entry)
     return None
 
@@ -79,6 +204,7 @@ def update_journal_entry(key: str, user_key: str, update_data: JournalEntryUpdat
     
     # Update the index
     doc = JournalDoc(
+        id=key,
         title=updated_entry['title'],
         content=updated_entry['content'],
         user_key=updated_entry['user_key'],
@@ -86,7 +212,17 @@ def update_journal_entry(key: str, user_key: str, update_data: JournalEntryUpdat
     )
     doc_index.index(DocList[JournalDoc]([doc]))
     
-    return JournalEntry(**updated_entry)
+    new_entry = JournalEntry(**updated_entry)
+    
+    # Keep the tag index in step with the new tags
+    if 'tags' in update_dict:
+        new_rows = _index_rows(new_entry)
+        new_keys = {row["key"] for row in new_rows}
+        _delete_index_rows([row for row in _index_rows(entry) if row["key"] not in new_keys])
+        _put_index_rows(new_rows)
+    
+    _record_change(user_key, key, OP_UPSERT)
+    return new_entry
 
 def delete_journal_entry(key: str, user_key: str) -> bool:
     entry = get_journal_entry(key, user_key)
@@ -94,16 +230,154 @@ def delete_journal_entry(key: str, user_key: str) -> bool:
         return False
     
     journal_base.delete(key)
+    _delete_index_rows(_index_rows(entry))
     
     try:
         del doc_index[key]
     except KeyError:
         pass
     
+    _record_change(user_key, key, OP_DELETE)
     return True
 
 def get_all_journal_entries(user_key: str) -> List[JournalEntry]:
-    entries = journal_base.fetch({"user_key": user_key}).items
+    entries = fetch_all(journal_base, {"user_key": user_key})
     return [JournalEntry(**entry) for entry in entries]
 
-__all__ = ['doc_index', 'JournalDoc', 'create_journal_entry', 'get_journal_entry', 'update_journal_entry', 'delete_journal_entry', 'get_all_journal_entries']
\ No newline at end of file
+def filter_journal_entries(
+    user_key: str,
+    tags: Optional[List[str]] = None,
+    match_all: bool = False,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    descending: bool = True,
+    skip: int = 0,
+    limit: int = 100,
+) -> List[JournalEntry]:
+    """List a user's entries, optionally by tag and creation date, using the secondary index.
+
+    Index rows are read in key order, which is the listing order, so a page reads
+    about `skip + limit` rows per tag and loads only its own entries from `journal_base`.
+    """
+    wanted = skip + limit
+    if limit <= 0:
+        return []
+
+    # Bounds on the fixed-width time part; '~' sorts after every digit and key character
+    first, last = (date_to, date_from) if descending else (date_from, date_to)
+    lower = _sortable_timestamp(utc_timestamp(first), descending) if first else ""
+    upper = _sortable_timestamp(utc_timestamp(last), descending) + "#~" if last else "~"
+
+    tags = list(dict.fromkeys(tags or [])) or [None]
+    streams = [
+        _iter_index(_index_prefix(user_key, tag, descending), lower, upper, min(wanted, INDEX_PAGE_SIZE))
+        for tag in tags
+    ]
+    required = len(tags) if match_all else 1
+
+    # Rows for the same entry share a sort key, so they arrive together from the merge
+    keys = []
+    for sort_key, group in groupby(heapq.merge(*streams), key=lambda item: item[0]):
+        group = list(group)
+        if len(group) >= required:
+            keys.append(group[0][1])
+            if len(keys) >= wanted:
+                break
+
+    entries = []
+    for key in keys[skip : skip + limit]:
+        entry = journal_base.get(key)
+        if entry and entry['user_key'] == user_key:
+            entries.append(JournalEntry(**entry))
+    return entries
+
+def get_journal_changes(user_key: str, since: int = 0) -> JournalChanges:
+    """Get the latest change of every entry modified after version `since`.
+
+    Changes up to CHANGE_FEED_OVERLAP versions below `since` are sent again, since a
+    concurrent write can land after a client has already moved past its version;
+    applying a change twice is harmless. The returned version is the newest row
+    actually read, so a cursor never passes a change whose row is still being
+    written. `relist` is set when the client has no cursor or its cursor has left
+    the change log, and it should relist instead.
+    """
+    version = get_user_version(user_key)
+    if since <= 0 or since > version:
+        return JournalChanges(version=version, changes=[], relist=True)
+
+    rows = fetch_all(journal_change_base, {"user_key": user_key, "version?gt": max(since - CHANGE_FEED_OVERLAP, 0)})
+    # Rows expire oldest first, so a surviving row at or below the cursor means nothing newer expired
+    if not any(row["version"] <= since for row in rows):
+        return JournalChanges(version=version, changes=[], relist=True)
+
+    latest = {}
+    for row in rows:
+        if row["entry_key"] not in latest or row["version"] > latest[row["entry_key"]]["version"]:
+            latest[row["entry_key"]] = row
+
+    changes = []
+    for row in sorted(latest.values(), key=lambda row: row["version"]):
+        entry = get_journal_entry(row["entry_key"], user_key) if row["op"] == OP_UPSERT else None
+        op = OP_UPSERT if entry else OP_DELETE
+        changes.append(JournalChange(entry_key=row["entry_key"], op=op, version=row["version"], entry=entry))
+    cursor = max([since] + [row["version"] for row in rows])
+    return JournalChanges(version=cursor, changes=changes)
+
+def get_user_vector_ids(user_key: str, limit: int = 100) -> List[str]:
+    """Get ids of a user's vectors, including any indexed under ids that are not entry keys."""
+    if isinstance(doc_index, QuantizedDocumentIndex):
+        return doc_index.ids_for_user(user_key, limit)
+    docs = doc_index.filter(filter_query={"user_key": {"$eq": user_key}}, limit=limit)
+    return [doc.id for doc in docs]
+
+def get_vector_user_keys() -> Optional[set]:
+    """Get the user keys owning vectors, or None when the index cannot list them cheaply."""
+    if isinstance(doc_index, QuantizedDocumentIndex):
+        return doc_index.user_keys()
+    return None
+
+def reindex_journal_entries(user_key: Optional[str] = None) -> int:
+    """Rebuild the secondary index rows for a user's entries, or for every entry if no user is given."""
+    query = {"user_key": user_key} if user_key else None
+    count = 0
+    for page in iter_pages(journal_base, query):
+        for entry in page:
+            _put_index_rows(_index_rows(JournalEntry(**entry)))
+        count += len(page)
+    return count
+
+def rebuild_vector_index() -> int:
+    """Index every stored entry's embedding, e.g. after switching VECTOR_INDEX_MODE.
+
+    Entries are keyed by their entry key, so re-running replaces rather than duplicates.
+    """
+    count = 0
+    for page in iter_pages(journal_base):
+        docs = [
+            JournalDoc(
+                id=entry['key'],
+                title=entry['title'],
+                content=entry['content'],
+                user_key=entry['user_key'],
+                embedding=np.array(entry['embedding'])
+            )
+            for entry in page
+            if entry.get('embedding')
+        ]
+        if docs:
+            doc_index.index(DocList[JournalDoc](docs))
+        count += len(docs)
+    return count
+
+__all__ = ['doc_index', 'JournalDoc', 'create_journal_entry', 'get_journal_entry', 'update_journal_entry', 'delete_journal_entry', 'get_all_journal_entries', 'filter_journal_entries', 'reindex_journal_entries', 'rebuild_vector_index', 'utc_timestamp', 'get_journal_entry_data', 'get_user_vector_ids', 'get_vector_user_keys', 'get_user_version', 'get_journal_changes']
+
+if __name__ == "__main__":
+    import logging
+    import sys
+    logging.basicConfig(level=logging.INFO)
+    if sys.argv[1:] == ["vectors"]:
+        # Fill the vector index for the configured VECTOR_INDEX_MODE from stored embeddings
+        logging.getLogger(__name__).info(f"Indexed vectors: {rebuild_vector_index()}")
+    else:
+        # Backfill the secondary index for entries created before it existed
+        logging.getLogger(__name__).info(f"Reindexed entries: {reindex_journal_entries()}")
@@ -0,0 +1,214 @@
+from app.core.config import settings
+from app.db.base import journal_base, journal_index_base, journal_change_base, journal_version_base, purge_base, user_base, fetch_all, iter_pages
+from app.services.journal import doc_index, get_user_vector_ids, get_vector_user_keys
+from datetime import datetime
+from typing import List, Optional
+import logging
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+# Define constants
+BATCH_SIZE = settings.PURGE_BATCH_SIZE
+STATUS_PENDING = "pending"
+STATUS_RUNNING = "running"
+STATUS_FAILED = "failed"
+STATUS_DONE = "done"
+# A worker renews its lease after every batch; Deta expires a lease left unrenewed this long
+LEASE_SECONDS = 300
+WORKER_ID = uuid.uuid4().hex
+
+def _now() -> str:
+    return datetime.utcnow().isoformat()
+
+def enqueue_user_purge(user_key: str) -> dict:
+    """Record a pending purge of a user's journal data.
+
+    The job is keyed by the user key, so enqueueing twice is harmless.
+    """
+    job = purge_base.get(user_key)
+    if job and job["status"] != STATUS_DONE:
+        return job
+    job = {
+        "key": user_key,
+        "status": STATUS_PENDING,
+        "purged_entries": 0,
+        "purged_vectors": 0,
+        "purged_index_rows": 0,
+        "purged_changes": 0,
+        "batches": 0,
+        "error": None,
+        "created_at": _now(),
+        "updated_at": _now(),
+    }
+    purge_base.put(job)
+    return job
+
+def get_purge_job(user_key: str) -> Optional[dict]:
+    """Get the purge job for a user, if any."""
+    return purge_base.get(user_key)
+
+def _lease_key(user_key: str) -> str:
+    return f"lease:{user_key}"
+
+def _claim_job(user_key: str) -> bool:
+    """Take the job's lease so no other worker runs it at the same time.
+
+    Deta's insert fails when the key exists, which makes it a compare-and-set.
+    An abandoned lease is freed by its TTL, never by another worker.
+    """
+    lease = {"key": _lease_key(user_key), "owner": WORKER_ID, "leased_until": time.time() + LEASE_SECONDS}
+    try:
+        purge_base.insert(lease, expire_in=LEASE_SECONDS)
+        return True
+    except Exception:
+        return False
+
+def _renew_lease(user_key: str) -> bool:
+    current = purge_base.get(_lease_key(user_key))
+    if not current or current["owner"] != WORKER_ID:
+        return False
+    purge_base.update({"leased_until": time.time() + LEASE_SECONDS}, _lease_key(user_key), expire_in=LEASE_SECONDS)
+    return True
+
+def _release_job(user_key: str):
+    current = purge_base.get(_lease_key(user_key))
+    if current and current["owner"] == WORKER_ID:
+        purge_base.delete(_lease_key(user_key))
+
+def _iter_batches(base, user_key: str, batch_size: int):
+    """Yield a user's rows in batches, keeping one Deta cursor across the whole scan.
+
+    Deleting rows the cursor has already passed does not disturb it.
+    """
+    batch = []
+    for page in iter_pages(base, {"user_key": user_key}):
+        batch.extend(page)
+        while len(batch) >= batch_size:
+            yield batch[:batch_size]
+            batch = batch[batch_size:]
+    if batch:
+        yield batch
+
+def _purge_entries(user_key: str, batch_size: int):
+    for entries in _iter_batches(journal_base, user_key, batch_size):
+        # Drop vectors before rows so a crash never leaves a vector without its row
+        for entry in entries:
+            try:
+                del doc_index[entry["key"]]
+            except (KeyError, RuntimeError):
+                pass
+        for entry in entries:
+            journal_base.delete(entry["key"])
+        yield len(entries)
+
+def _purge_vectors(user_key: str, batch_size: int):
+    # Catches vectors indexed under ids other than their entry key
+    while True:
+        purged = 0
+        for key in get_user_vector_ids(user_key, batch_size):
+            try:
+                del doc_index[key]
+                purged += 1
+            except (KeyError, RuntimeError):
+                pass
+        if not purged:
+            return
+        yield purged
+
+def _purge_rows(base, user_key: str, batch_size: int):
+    for rows in _iter_batches(base, user_key, batch_size):
+        for row in rows:
+            base.delete(row["key"])
+        yield len(rows)
+
+def _purge_index_rows(user_key: str, batch_size: int):
+    return _purge_rows(journal_index_base, user_key, batch_size)
+
+def _purge_changes(user_key: str, batch_size: int):
+    return _purge_rows(journal_change_base, user_key, batch_size)
+
+def run_user_purge(user_key: str, batch_size: int = BATCH_SIZE) -> Optional[dict]:
+    """Purge a user's entries and vectors in batches, recording progress on the job.
+
+    Every batch deletes what it purged, so an interrupted job resumes where it stopped.
+    A job whose lease is held by another worker is left alone.
+    """
+    job = purge_base.get(user_key)
+    if job is None or job["status"] == STATUS_DONE:
+        return job
+    if not _claim_job(user_key):
+        logger.info(f"Skipping purge for user {user_key}: leased by another worker")
+        return job
+
+    purge_base.update({"status": STATUS_RUNNING, "owner": WORKER_ID, "error": None, "updated_at": _now()}, user_key)
+    try:
+        for purge_stage, counter in (
+            (_purge_entries, "purged_entries"),
+            (_purge_vectors, "purged_vectors"),
+            (_purge_index_rows, "purged_index_rows"),
+            (_purge_changes, "purged_changes"),
+        ):
+            for purged in purge_stage(user_key, batch_size):
+                if not _renew_lease(user_key):
+                    logger.warning(f"Lost the purge lease for user {user_key}; stopping")
+                    return purge_base.get(user_key)
+                purge_base.update({
+                    counter: purge_base.util.increment(purged),
+                    "batches": purge_base.util.increment(1),
+                    "updated_at": _now(),
+                }, user_key)
+    except Exception as e:
+        logger.error(f"Error purging data for user {user_key}: {str(e)}")
+        purge_base.update({"status": STATUS_FAILED, "error": str(e), "updated_at": _now()}, user_key)
+        _release_job(user_key)
+        return purge_base.get(user_key)
+
+    journal_version_base.delete(user_key)
+    purge_base.update({"status": STATUS_DONE, "updated_at": _now()}, user_key)
+    _release_job(user_key)
+    return purge_base.get(user_key)
+
+def resume_pending_purges() -> List[str]:
+    """Run every purge job that has not finished, e.g. after a crash or restart."""
+    jobs = fetch_all(purge_base, [
+        {"status": STATUS_PENDING},
+        {"status": STATUS_RUNNING},
+        {"status": STATUS_FAILED},
+    ])
+    for job in jobs:
+        run_user_purge(job["key"])
+    return [job["key"] for job in jobs]
+
+def _user_keys_in(base) -> set:
+    # Only the user keys are kept, one page of rows at a time
+    user_keys = set()
+    for page in iter_pages(base):
+        user_keys.update(item["user_key"] for item in page)
+    return user_keys
+
+def sweep_orphaned_entries() -> List[str]:
+    """Find journal data and vectors whose user no longer exists and purge them."""
+    user_keys = _user_keys_in(journal_base) | _user_keys_in(journal_index_base)
+    vector_user_keys = get_vector_user_keys()
+    if vector_user_keys is not None:
+        user_keys |= vector_user_keys
+    else:
+        # The HNSW index cannot list its owners, so recheck users purged earlier for stray vectors
+        for job in fetch_all(purge_base, {"status": STATUS_DONE}):
+            if get_user_vector_ids(job["key"], 1):
+                user_keys.add(job["key"])
+
+    orphaned = [user_key for user_key in sorted(user_keys) if user_base.get(user_key) is None]
+    for user_key in orphaned:
+        enqueue_user_purge(user_key)
+        run_user_purge(user_key)
+    return orphaned
+
+__all__ = ['enqueue_user_purge', 'get_purge_job', 'run_user_purge', 'resume_pending_purges', 'sweep_orphaned_entries']
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    logger.info(f"Resumed purges: {resume_pending_purges()}")
+    logger.info(f"Swept orphaned users: {sweep_orphaned_entries()}")
@@ -1,14 +1,24 @@
 from app.utils.embeddings import get_embedding
 from app.services.journal import doc_index
+from app.services.vector_index import QuantizedDocumentIndex
 import numpy as np
 
 def search_entries(query: str, user_key: str, limit: int = 10):
     query_embedding = get_embedding(query)
-    matches, scores = doc_index.find(
-        np.array(query_embedding),
-        search_field='embedding',
-        limit=limit
-    )
+    if isinstance(doc_index, QuantizedDocumentIndex):
+        # The quantized index scores only the user's vectors; its scores are cosine similarities
+        matches, scores = doc_index.find(
+            np.array(query_embedding),
+            search_field='embedding',
+            limit=limit,
+            user_key=user_key
+        )
+    else:
+        matches, scores = doc_index.find(
+            np.array(query_embedding),
+            search_field='embedding',
+            limit=limit
+        )
     
     results = [
         {
@@ -0,0 +1,362 @@
+from typing import Callable, List, Optional, Tuple
+import numpy as np
+import gc
+import tempfile
+import threading
+import tracemalloc
+import time
+import os
+
+# Define constants
+INITIAL_CAPACITY = 1024
+SCAN_CHUNK_SIZE = 65536
+INT8_MAX = 127
+NO_OWNER = -1
+# Rewrite the slot log on open once it holds this many times more lines than live slots
+COMPACT_RATIO = 2
+COMPACT_MIN_LINES = 1024
+
+class QuantizedDocumentIndex:
+    """A memory-bounded vector index built on int8 scalar quantization.
+
+    Each vector is kept twice in `work_dir`: as int8 codes with a per-vector
+    scale, which are scanned to pick candidates, and as full float32 values in
+    a memory-mapped side file, which are only read to re-rank those candidates
+    by exact cosine similarity. Slot assignments live in an append-only log,
+    compacted on open once churn outgrows the live slots. Each slot's user is
+    kept as a small integer code so a search scores only that user's vectors.
+
+    It mirrors the parts of the docarray index API the app uses: `index`,
+    `del index[key]` and `find`.
+    """
+
+    def __init__(
+        self,
+        work_dir: str,
+        dim: int,
+        load_doc: Callable[[str], Optional[object]] = None,
+        rerank_factor: int = 4,
+    ):
+        self.work_dir = work_dir
+        self.dim = dim
+        self.load_doc = load_doc
+        self.rerank_factor = max(1, rerank_factor)
+        self._lock = threading.Lock()
+
+        os.makedirs(work_dir, exist_ok=True)
+        self._vectors_path = os.path.join(work_dir, "vectors.f32")
+        self._codes_path = os.path.join(work_dir, "codes.i8")
+        self._stats_path = os.path.join(work_dir, "stats.f32")
+        self._log_path = os.path.join(work_dir, "slots.log")
+
+        self._slots = {}
+        self._ids: List[Optional[str]] = []
+        self._owners = np.full(0, NO_OWNER, dtype=np.int32)
+        self._owner_codes = {}
+        self._owner_names: List[str] = []
+        self._free: List[int] = []
+        log_lines = self._replay_log()
+        if log_lines > COMPACT_RATIO * len(self._slots) + COMPACT_MIN_LINES:
+            self._compact_log()
+
+        capacity = INITIAL_CAPACITY
+        if os.path.exists(self._codes_path):
+            capacity = os.path.getsize(self._codes_path) // dim
+        self._open(max(capacity, INITIAL_CAPACITY, len(self._ids)))
+
+    def _owner_code(self, user_key: Optional[str]) -> int:
+        if not user_key:
+            return NO_OWNER
+        code = self._owner_codes.get(user_key)
+        if code is None:
+            code = self._owner_codes[user_key] = len(self._owner_names)
+            self._owner_names.append(user_key)
+        return code
+
+    def _new_slot(self) -> int:
+        slot = len(self._ids)
+        self._ids.append(None)
+        if slot >= len(self._owners):
+            grown = np.full(max(INITIAL_CAPACITY, 2 * len(self._owners)), NO_OWNER, dtype=np.int32)
+            grown[: len(self._owners)] = self._owners
+            self._owners = grown
+        return slot
+
+    def _replay_log(self) -> int:
+        """Rebuild the slot map from the log and return how many lines it had."""
+        if not os.path.exists(self._log_path):
+            return 0
+        lines = 0
+        with open(self._log_path) as log:
+            for line in log:
+                lines += 1
+                parts = line.rstrip("\n").split("\t")
+                if len(parts) < 3:
+                    # Torn final line from a crash mid-append
+                    continue
+                op, slot, key = parts[0], int(parts[1]), parts[2]
+                while len(self._ids) <= slot:
+                    self._new_slot()
+                if op == "+":
+                    self._ids[slot] = key
+                    self._owners[slot] = self._owner_code(parts[3] if len(parts) > 3 else None)
+                    self._slots[key] = slot
+                elif self._slots.get(key) == slot:
+                    self._ids[slot] = None
+                    self._owners[slot] = NO_OWNER
+                    del self._slots[key]
+        self._free = [slot for slot, key in enumerate(self._ids) if key is None]
+        return lines
+
+    def _compact_log(self):
+        """Rewrite the slot log with one line per live slot, replacing it atomically."""
+        temp_path = self._log_path + ".tmp"
+        with open(temp_path, "w") as log:
+            for slot, key in enumerate(self._ids):
+                if key is None:
+                    continue
+                owner = self._owners[slot]
+                user_key = self._owner_names[owner] if owner != NO_OWNER else ""
+                log.write(f"+\t{slot}\t{key}\t{user_key}\n")
+            log.flush()
+            os.fsync(log.fileno())
+        os.replace(temp_path, self._log_path)
+
+    def _open(self, capacity: int):
+        """Open (and if needed grow) the memory-mapped arrays to hold `capacity` vectors."""
+        for path, itemsize, width in (
+            (self._vectors_path, 4, self.dim),
+            (self._codes_path, 1, self.dim),
+            (self._stats_path, 4, 2),
+        ):
+            size = capacity * itemsize * width
+            with open(path, "ab") as f:
+                if f.tell() < size:
+                    f.truncate(size)
+        self._capacity = capacity
+        self._vectors = np.memmap(self._vectors_path, dtype=np.float32, mode="r+", shape=(capacity, self.dim))
+        self._codes = np.memmap(self._codes_path, dtype=np.int8, mode="r+", shape=(capacity, self.dim))
+        # Per-vector quantization scale and L2 norm; a zero norm marks an empty slot
+        self._stats = np.memmap(self._stats_path, dtype=np.float32, mode="r+", shape=(capacity, 2))
+
+    def _append_log(self, lines: List[str]):
+        with open(self._log_path, "a") as log:
+            log.write("".join(lines))
+            log.flush()
+            os.fsync(log.fileno())
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def index(self, docs):
+        """Add or replace documents, keyed by their `id`."""
+        lines = []
+        with self._lock:
+            for doc in docs:
+                slot = self._slots.get(doc.id)
+                if slot is None:
+                    slot = self._free.pop() if self._free else self._new_slot()
+                    if slot >= self._capacity:
+                        self._flush()
+                        self._open(self._capacity * 2)
+                self._write(slot, np.asarray(doc.embedding, dtype=np.float32))
+                user_key = getattr(doc, "user_key", None)
+                self._ids[slot] = doc.id
+                self._owners[slot] = self._owner_code(user_key)
+                self._slots[doc.id] = slot
+                lines.append(f"+\t{slot}\t{doc.id}\t{user_key or ''}\n")
+            # Vectors reach disk before the log points at them
+            self._flush()
+            self._append_log(lines)
+
+    def _write(self, slot: int, vector: np.ndarray):
+        norm = float(np.linalg.norm(vector))
+        scale = float(np.abs(vector).max()) / INT8_MAX or 1.0
+        self._vectors[slot] = vector
+        self._codes[slot] = np.clip(np.rint(vector / scale), -INT8_MAX, INT8_MAX).astype(np.int8)
+        self._stats[slot] = (scale, norm)
+
+    def _flush(self):
+        self._vectors.flush()
+        self._codes.flush()
+        self._stats.flush()
+
+    def __delitem__(self, key):
+        keys = [key] if isinstance(key, str) else list(key)
+        with self._lock:
+            missing = [k for k in keys if k not in self._slots]
+            if missing:
+                raise KeyError(missing[0])
+            lines = []
+            for k in keys:
+                slot = self._slots.pop(k)
+                self._stats[slot] = (0.0, 0.0)
+                self._ids[slot] = None
+                self._owners[slot] = NO_OWNER
+                self._free.append(slot)
+                lines.append(f"-\t{slot}\t{k}\n")
+            self._flush()
+            self._append_log(lines)
+
+    def ids_for_user(self, user_key: str, limit: int = None) -> List[str]:
+        """Return ids of vectors indexed for a user, whatever id they were indexed under."""
+        with self._lock:
+            code = self._owner_codes.get(user_key)
+            if code is None:
+                return []
+            slots = np.flatnonzero(self._owners[: len(self._ids)] == code)
+            return [self._ids[slot] for slot in slots[:limit]]
+
+    def user_keys(self) -> set:
+        """Return every user key that owns at least one vector."""
+        with self._lock:
+            codes = np.unique(self._owners[: len(self._ids)])
+            return {self._owner_names[code] for code in codes if code != NO_OWNER}
+
+    def find_ids(
+        self,
+        query,
+        limit: int = 10,
+        rerank_factor: int = None,
+        user_key: Optional[str] = None,
+    ) -> Tuple[List[str], np.ndarray]:
+        """Return the ids and exact cosine similarities of the `limit` nearest vectors.
+
+        With `user_key`, only that user's vectors are considered.
+        """
+        query = np.asarray(query, dtype=np.float32)
+        query_norm = float(np.linalg.norm(query)) or 1.0
+        rerank_factor = rerank_factor or self.rerank_factor
+
+        with self._lock:
+            count = len(self._ids)
+            if not self._slots or limit <= 0:
+                return [], np.zeros(0, dtype=np.float32)
+            slots = None
+            if user_key is not None:
+                owner = self._owner_codes.get(user_key)
+                if owner is None:
+                    return [], np.zeros(0, dtype=np.float32)
+                # Only the user's rows are scored, not every code in the index
+                slots = np.flatnonzero(self._owners[:count] == owner)
+            total = count if slots is None else len(slots)
+
+            # Approximate scores from the int8 codes, a chunk at a time
+            approx = np.empty(total, dtype=np.float32)
+            for start in range(0, total, SCAN_CHUNK_SIZE):
+                stop = min(start + SCAN_CHUNK_SIZE, total)
+                rows = slice(start, stop) if slots is None else slots[start:stop]
+                dots = self._codes[rows].astype(np.float32) @ query
+                scale, norm = self._stats[rows, 0], self._stats[rows, 1]
+                with np.errstate(divide="ignore", invalid="ignore"):
+                    approx[start:stop] = np.where(norm > 0, dots * scale / norm, -np.inf)
+
+            n_candidates = min(limit * rerank_factor, int(np.isfinite(approx).sum()))
+            if n_candidates == 0:
+                return [], np.zeros(0, dtype=np.float32)
+            candidates = np.argpartition(-approx, n_candidates - 1)[:n_candidates]
+            if slots is not None:
+                candidates = slots[candidates]
+            # Sorted slots keep reads from the side file close to sequential
+            candidates.sort()
+
+            vectors = np.asarray(self._vectors[candidates])
+            norms = self._stats[candidates, 1] * query_norm
+            exact = np.divide(vectors @ query, norms, out=np.zeros(len(candidates), dtype=np.float32), where=norms > 0)
+            order = np.argsort(-exact)[:limit]
+            return [self._ids[candidates[i]] for i in order], exact[order]
+
+    def find(self, query, search_field: str = "embedding", limit: int = 10, user_key: Optional[str] = None):
+        """Find the nearest documents, loaded through `load_doc`, with their cosine similarities."""
+        ids, scores = self.find_ids(query, limit, user_key=user_key)
+        docs, doc_scores = [], []
+        for key, score in zip(ids, scores):
+            doc = self.load_doc(key) if self.load_doc else None
+            if doc is not None:
+                docs.append(doc)
+                doc_scores.append(score)
+        return docs, np.array(doc_scores, dtype=np.float32)
+
+def _exact_top_k(vectors: np.ndarray, query: np.ndarray, k: int, members: np.ndarray = None) -> set:
+    if members is None:
+        members = np.arange(len(vectors))
+    scores = (vectors[members] @ query) / (np.linalg.norm(vectors[members], axis=1) * np.linalg.norm(query))
+    return set(members[np.argsort(-scores)[:k]].tolist())
+
+def benchmark_recall(
+    n: int = 20000,
+    dim: int = 384,
+    k: int = 10,
+    n_queries: int = 100,
+    rerank_factors=(1, 2, 4, 8),
+    vectors_per_user: int = 500,
+    seed: int = 0,
+) -> List[dict]:
+    """Measure recall@k of the quantized index against exact search on clustered random vectors.
+
+    The "user" scope filters by user as search does in the app; "all" searches every vector.
+    """
+    rng = np.random.default_rng(seed)
+    n_users = max(1, n // vectors_per_user)
+    owners = np.arange(n) % n_users
+    centers = rng.normal(size=(max(1, n // 100), dim)).astype(np.float32)
+    vectors = centers[rng.integers(len(centers), size=n)] + 0.3 * rng.normal(size=(n, dim)).astype(np.float32)
+    sources = rng.integers(n, size=n_queries)
+    queries = vectors[sources] + 0.1 * rng.normal(size=(n_queries, dim)).astype(np.float32)
+    query_users = [f"user{owners[source]:028x}" for source in sources]
+
+    class _Doc:
+        def __init__(self, id, embedding, user_key):
+            self.id = id
+            self.embedding = embedding
+            self.user_key = user_key
+
+    results = []
+    with tempfile.TemporaryDirectory() as work_dir:
+        # Python-side bookkeeping (ids, slot map, owner codes) held in RAM, measured
+        tracemalloc.start()
+        baseline = tracemalloc.get_traced_memory()[0]
+        index = QuantizedDocumentIndex(work_dir, dim)
+        docs = [_Doc(f"{i:032x}", vector, f"user{owners[i]:028x}") for i, vector in enumerate(vectors)]
+        index.index(docs)
+        del docs
+        gc.collect()
+        bookkeeping = (tracemalloc.get_traced_memory()[0] - baseline) / n
+        tracemalloc.stop()
+        truth = {
+            "all": [_exact_top_k(vectors, query, k) for query in queries],
+            "user": [
+                _exact_top_k(vectors, query, k, np.flatnonzero(owners == owners[source]))
+                for query, source in zip(queries, sources)
+            ],
+        }
+
+        for scope, rerank_factor in [(scope, factor) for scope in ("user", "all") for factor in rerank_factors]:
+            hits = 0
+            started = time.perf_counter()
+            for query, user_key, expected in zip(queries, query_users, truth[scope]):
+                ids, _ = index.find_ids(
+                    query, k, rerank_factor=rerank_factor, user_key=user_key if scope == "user" else None
+                )
+                hits += len(expected & {int(key, 16) for key in ids})
+            elapsed = time.perf_counter() - started
+            results.append({
+                "scope": scope,
+                "rerank_factor": rerank_factor,
+                f"recall@{k}": hits / (k * n_queries),
+                "ms_per_query": 1000 * elapsed / n_queries,
+            })
+
+    # Codes and stats are scanned on every query, so they stay in the page cache
+    for result in results:
+        result["mapped_code_bytes_per_vector"] = dim + 8
+        result["bookkeeping_bytes_per_vector"] = round(bookkeeping)
+        result["resident_bytes_per_vector"] = dim + 8 + round(bookkeeping)
+        result["float32_bytes_per_vector"] = dim * 4
+    return results
+
+__all__ = ['QuantizedDocumentIndex', 'benchmark_recall']
+
+if __name__ == "__main__":
+    for result in benchmark_recall():
+        print(result)